@@ -1,6 +1,5 @@
 from flask import Flask , render_template
 from flask_socketio import SocketIO, send
-import werkzeug
 
 app = Flask(__name__)
 app.config['SECRET'] = "secret!123"
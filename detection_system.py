@@ -25,23 +25,29 @@ classes=['Apple scab', 'Apple Black rot', 'Cedar apple rust',
          'Tomato mosaic virus', 'Tomato healthy']
 
 
-def load_image(filename):
+def load_image(filename, out=None):
     img = cv2.imread(filename)
     img = cv2.resize(img, (IMAGE_SIZE[0], IMAGE_SIZE[1]) )
-    img = img /255
+    # Scale straight into float32 (optionally into a caller's buffer)
+    img = np.divide(img, 255, out=out, dtype=np.float32)
     
     return img
 
-def predict(image):
-    probabilities = model_finetuned.predict(np.asarray([image]))[0]
-    class_idx = np.argmax(probabilities)
-    return class_idx
+def predict_batch(images):
+    # Keras rejects an empty batch; an empty folder simply has nothing to show
+    if len(images) == 0:
+        return np.empty(0, dtype=np.int64)
+    probabilities = model_finetuned.predict(np.asarray(images))
+    return np.argmax(probabilities, axis=1)
 
 path ='D:/Computer/Assignments/PlantDisease/Datasets/test/test/'
 PList=glob.glob('D:/Computer/Assignments/PlantDisease/Datasets/test/test/*')
-for filename in PList:
-    img = load_image(str(filename))
-    prediction = predict(img)
+# One forward pass over the whole folder instead of one per image
+images = np.empty((len(PList), IMAGE_SIZE[0], IMAGE_SIZE[1], 3), dtype=np.float32)
+for i, filename in enumerate(PList):
+    load_image(str(filename), out=images[i])
+predictions = predict_batch(images)
+for img, prediction in zip(images, predictions):
     print(classes[prediction])
     # cv2.WINDOW_NORMAL
     # cv2.putText(img, classes[prediction], (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
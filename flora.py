@@ -1,12 +1,18 @@
 from flask import Flask, render_template, request, redirect, url_for, session
 from keras.models import load_model
+import tensorflow as tf
 import numpy as np
-from exif import Image as im
 from geopy.geocoders import Nominatim #geolocation services
-import cv2
-from flask_mysqldb import MySQL
+from PIL import Image, ImageOps
+from io import BytesIO
 import MySQLdb.cursors
 import re
+import hashlib
+import glob
+import os
+from collections import OrderedDict
+from functools import lru_cache
+import threading
 
 
 
@@ -25,7 +31,9 @@ mysql = MySQLdb.connect(
     db=app.config['MYSQL_DB']
 )
 
-classes=['Apple scab', 'Apple Black rot', 'Cedar apple rust', 
+IMAGE_SIZE = (224, 224)
+
+classes=('Apple scab', 'Apple Black rot', 'Cedar apple rust', 
          'Apple healthy', 'Blueberry healthy', 
          'Cherry Powdery mildew', 'Cherry healthy', 
          'Corn Cercospora leaf spot', 'Corn Common rust', 
@@ -40,12 +48,64 @@ classes=['Apple scab', 'Apple Black rot', 'Cedar apple rust',
          'Tomato Early blight', 'Tomato Late blight', 'Tomato Leaf Mold', 
          'Tomato Septoria leaf spot', 'Tomato Spider mites', 
          'Tomato Target Spot', 'Tomato Yellow Leaf Curl Virus', 
-         'Tomato mosaic virus', 'Tomato healthy']
+         'Tomato mosaic virus', 'Tomato healthy')
+healthy_classes = frozenset(c for c in classes if 'healthy' in c.casefold())
 
 
 
 model = load_model("LensFleur-Flora.AI/model_finetuned.h5") 
 
+# Traced once for the fixed single-image shape; model.predict() goes through
+# Keras's batching machinery on every call, which dominates for one image
+@tf.function(input_signature=[tf.TensorSpec((1,) + IMAGE_SIZE + (3,), tf.float32)])
+def infer(x):
+    return model(x, training=False)
+
+infer(tf.zeros((1,) + IMAGE_SIZE + (3,)))
+
+# Class index of recently uploaded images, keyed by a digest of the file bytes
+PREDICTION_CACHE_SIZE = 128
+prediction_cache = OrderedDict()
+# Request threads share the cache, so lookups and evictions happen under a lock
+prediction_cache_lock = threading.Lock()
+
+geocoder = Nominatim(user_agent = 'Flora')
+
+# Repeat uploads from the same field skip the round trip to Nominatim
+@lru_cache(maxsize=256)
+def reverse_geocode(coord):
+    return geocoder.reverse(coord)
+
+# Treatment write-ups are static, so read them all once at startup
+treatment_data = {}
+for path in glob.glob("LensFleur-Flora.AI/static/*.txt"):
+    with open(path, "r") as file:
+        treatment_data[os.path.splitext(os.path.basename(path))[0]] = file.read()
+treatment_folded = {k.casefold(): v for k, v in treatment_data.items()}
+treatment_compact = {k.casefold().replace(' ', ''): v for k, v in treatment_data.items()}
+
+def find_treatment_data(name):
+    if name in treatment_data:
+        return treatment_data[name]
+    key = name.casefold()
+    if key in treatment_folded:
+        return treatment_folded[key]
+    return treatment_compact.get(key.replace(' ', ''))
+
+# A few write-ups head the chemical section "Inorganic Solution:" or "Inorganic Methods:"
+treatment_sections = re.compile(r'(Symptoms:|Cycle and Lethality:|Organic Solutions:|Inorganic (?:Solutions?|Methods):|Src:)')
+treatment_labels = (("Symptoms:", "Symptoms: "), ("Cycle and Lethality:", "Cycle and Lethality: "),
+                    ("Organic Solutions:", "Organic Solutions: "), ("Inorganic Solutions:", "Inorganic Solutions: "),
+                    ("Src:", "Find out more at: "))
+
+def parse_treatment(description):
+    # One scan splits out every section; sections a file lacks come back empty
+    parts = treatment_sections.split(description)
+    sections = {("Inorganic Solutions:" if header.startswith("Inorganic") else header): body
+                for header, body in zip(parts[1::2], parts[2::2])}
+    return [parts[0]] + [label + sections[header] if header in sections else ""
+                         for header, label in treatment_labels]
+
 @app.route('/', methods = ['GET'])
 def index():
     return render_template('index1.html')
@@ -125,49 +185,60 @@ def predict():
     cur = mysql.cursor()
     image = request.files['image']
     # Make prediction using model loaded from disk as per the data.
-    image_path = image.filename
-    image.save(image_path)
-    with open(image_path, 'rb') as src:
-        copy = im(src)
+    image_bytes = image.read()
+    img = Image.open(BytesIO(image_bytes))
+    # Read only the GPS IFD of the header instead of parsing every EXIF tag
+    gps = img.getexif().get_ifd(0x8825)
     
-    my_image = cv2.imread(image_path)
-    my_image = cv2.resize(my_image, (224, 224) )
-    my_image = my_image /255
-    probabilities = model.predict(np.asarray([my_image]))[0]
-    class_idx = np.argmax(probabilities)
+    # Re-uploads of the same photo skip the model entirely
+    key = hashlib.blake2b(image_bytes, digest_size=16).digest()
+    with prediction_cache_lock:
+        class_idx = prediction_cache.get(key)
+        if class_idx is not None:
+            prediction_cache.move_to_end(key)
+    if class_idx is None:
+        # Let libjpeg scale down while decoding instead of decoding full size
+        img.draft('RGB', IMAGE_SIZE)
+        # Apply the EXIF Orientation tag like cv2.imread did, so portrait
+        # phone photos reach the model upright
+        img = ImageOps.exif_transpose(img.convert('RGB'))
+        img = img.resize(IMAGE_SIZE, Image.BILINEAR)
+        # Flip to BGR, the channel order the model has always been fed (cv2)
+        my_image = np.asarray(img)[:, :, ::-1] /255
+        probabilities = infer(np.asarray([my_image], dtype=np.float32)).numpy()[0]
+        class_idx = np.argmax(probabilities)
+        with prediction_cache_lock:
+            prediction_cache[key] = class_idx
+            if len(prediction_cache) > PREDICTION_CACHE_SIZE:
+                prediction_cache.popitem(last=False)
     prediction = classes[class_idx]
     
     #Geolocation Services
-    geocoder = Nominatim(user_agent = 'Flora')
-    if copy.has_exif:    
-        TheDegreeValue, TheMinuteValue, TheSecondValue = copy.gps_latitude
-        TheLatitudeValue=TheDegreeValue+(TheMinuteValue/60)+(TheSecondValue/3600)
-        TheDegreeValue, TheMinuteValue, TheSecondValue = copy.gps_longitude
-        TheLongitudeValue=TheDegreeValue+(TheMinuteValue/60)+(TheSecondValue/3600)
+    if 2 in gps and 4 in gps:    
+        TheDegreeValue, TheMinuteValue, TheSecondValue = gps[2]
+        TheLatitudeValue=float(TheDegreeValue+(TheMinuteValue/60)+(TheSecondValue/3600))
+        if gps.get(1) == 'S':
+            TheLatitudeValue = -TheLatitudeValue
+        TheDegreeValue, TheMinuteValue, TheSecondValue = gps[4]
+        TheLongitudeValue=float(TheDegreeValue+(TheMinuteValue/60)+(TheSecondValue/3600))
+        if gps.get(3) == 'W':
+            TheLongitudeValue = -TheLongitudeValue
         coord = (TheLatitudeValue, TheLongitudeValue)
-        geolocation= geocoder.reverse(coord)
+        geolocation= reverse_geocode(coord)
         
     else:
         geolocation = "No GPS Data"
-    file = open("LensFleur-Flora.AI/static/" + prediction.title() + ".txt", "r") 
-    if "Healthy" in prediction or "healthy" in prediction:
-        basic = file.read()
+    treatment = find_treatment_data(prediction)
+    if treatment is None:
+        app.logger.warning("No treatment text found for %s", prediction)
+        treatment = ""
+    if prediction in healthy_classes:
+        basic = treatment
        
         return render_template('Result.html', prediction=prediction, geolocation=geolocation, basic=basic)
        
     else:
-        description = file.read()
-        basics = description.split("Symptoms:")
-        basic = basics[0]
-        symp = basics[1].split("Cycle and Lethality:")
-        symptoms = "Symptoms: "+symp[0]
-        cyc = symp[1].split("Organic Solutions:")
-        cycle = "Cycle and Lethality: "+cyc[0]
-        organic = cyc[1].split("Inorganic Solutions:")
-        organics = "Organic Solutions: "+ organic[0]
-        inorganic = organic[1].split("Src:")
-        inorganics = "Inorganic Solutions: "+inorganic[0]
-        src = "Find out more at: "+inorganic[1]
+        basic, symptoms, cycle, organics, inorganics, src = parse_treatment(treatment)
 
 
         
@@ -178,7 +249,7 @@ def predict():
         cur.close()
 
         assert1 = ""
-        if num_detect > 2 and "Healthy" not in prediction.title():
+        if num_detect > 2:
             assert1 = "Data suggests there is a spike of "+prediction +" in "+str(geolocation)+". Please consult the appropriate authorities while we share our data to adequately combat the issue."
         
         return render_template('Result.html', prediction=prediction, geolocation=geolocation, basic=basic, symptoms=symptoms, cycle=cycle, organics=organics, inorganics=inorganics, src=src, 